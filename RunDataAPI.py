@@ -1,6 +1,9 @@
 import requests
 import webbrowser
 import os
+from datetime import datetime
+
+__all__ = ['get_strava_tokens']
 
 def get_strava_tokens():
     """
@@ -86,5 +89,4 @@ def get_strava_tokens():
         return None
 
 if __name__ == "__main__":
-    from datetime import datetime
     get_strava_tokens()
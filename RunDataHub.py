@@ -1,32 +1,272 @@
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import json
 from datetime import datetime
+from pathlib import Path
 import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson is optional; fall back to the standard library
+    _json_loads = json.loads
+
+__all__ = ['StravaAnalyzer', 'RateLimiter', 'ACTIVITY_FIELDS', 'DERIVED_FIELDS', 'DAY_NAMES', 'LAST_SYNC_FILE']
+
+# Sidecar written next to the saved CSV so later runs only fetch new activities
+LAST_SYNC_FILE = "last_sync.json"
+
+# Derived columns stored as float32 (GPS noise is far above single-precision error)
+FLOAT32_FIELDS = ['distance_km', 'moving_time_min', 'pace_min_per_km_moving', 'elevation_gain_km']
+
+# Count columns and the narrowest dtype that holds their values (missing counts become 0)
+INT_DOWNCAST = {
+    'kudos_count': np.int32,
+    'comment_count': np.int16,
+    'athlete_count': np.int16,
+    'photo_count': np.int16,
+    'achievement_count': np.int16,
+    'pr_count': np.int16,
+    'suffer_score': np.int16,
+    'segment_efforts_count': np.int16,
+}
+
+# Date parts of start_date; nullable so an unparseable date stays missing instead of year 0
+DATE_PART_DTYPES = {
+    'year': 'Int16',
+    'month': 'Int8',
+    'day_of_week': 'Int8',
+    'hour': 'Int8',
+}
+
+# Low-cardinality text columns stored as pandas categoricals
+CATEGORY_COLUMNS = [
+    'type', 'sport_type', 'workout_type_name', 'device_name',
+    'location_city', 'location_state', 'location_country',
+]
+
+# Names for the integer day_of_week column (Monday=0)
+DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Top-level activity fields kept when building the DataFrame; everything else
+# in the detailed payload (splits, laps, polylines, ...) is discarded
+ACTIVITY_FIELDS = [
+    'id', 'name', 'type', 'sport_type', 'workout_type',
+    'start_date', 'start_date_local', 'timezone',
+    'distance', 'moving_time', 'elapsed_time',
+    'total_elevation_gain', 'elev_high', 'elev_low',
+    'average_speed', 'max_speed',
+    'average_heartrate', 'max_heartrate', 'has_heartrate',
+    'average_cadence', 'average_temp', 'average_watts', 'kilojoules', 'calories',
+    'suffer_score', 'kudos_count', 'comment_count', 'athlete_count', 'photo_count',
+    'achievement_count', 'pr_count',
+    'manual', 'trainer', 'commute', 'private',
+    'device_name', 'gear_id',
+    'location_city', 'location_state', 'location_country',
+    'start_latlng', 'end_latlng',
+]
+
+# Numeric API fields, stored as float64 arrays (NaN when missing) so a batch
+# where a field is always None still gets a float column rather than object
+NUMERIC_FIELDS = {
+    'distance', 'moving_time', 'elapsed_time', 'total_elevation_gain',
+    'average_speed', 'max_speed', 'average_temp', 'average_cadence',
+    'average_heartrate', 'max_heartrate', 'elev_high', 'elev_low',
+    'calories', 'kilojoules', 'average_watts',
+}
+
+# Metrics added by _activities_to_dataframe, written after the raw fields
+DERIVED_FIELDS = [
+    'distance_km', 'elapsed_time_min', 'moving_time_min', 'efficiency_ratio',
+    'average_speed_kmh', 'max_speed_kmh',
+    'pace_min_per_km_elapsed', 'pace_min_per_km_moving',
+    'year', 'month', 'day_of_week', 'hour',
+    'has_hr_data', 'elevation_gain_km', 'segment_efforts_count',
+    'workout_type_name', 'is_manual', 'temperature_c', 'cadence_rpm',
+]
+
+
+def _safe_divide(numerator, denominator):
+    """Element-wise division that yields NaN instead of inf where the denominator is not positive"""
+    return np.divide(numerator, denominator, out=np.full(len(numerator), np.nan), where=denominator > 0)
+
+
+class RateLimiter:
+    """Thread-safe sliding-window limiter for Strava's request quotas"""
+
+    def __init__(self, limits=((100, 15 * 60), (1000, 24 * 60 * 60)), min_headroom=10):
+        """
+        Args:
+            limits: (max_requests, window_seconds) pairs that must all be respected,
+                in the order Strava reports them (15-minute, then daily)
+            min_headroom: Remaining server-reported quota at or below which requests
+                wait for that quota window to reset
+        """
+        self.limits = limits
+        self.min_headroom = min_headroom
+        self.headroom = None
+        self._remaining = None
+        self._blocked_until = None
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def update(self, headers):
+        """Refresh the quota estimate from Strava's X-RateLimit-* response headers"""
+        usage = headers.get('X-RateLimit-Usage')
+        limit = headers.get('X-RateLimit-Limit')
+        if not usage or not limit:
+            return
+        try:
+            used = [int(x) for x in usage.split(',')]
+            allowed = [int(x) for x in limit.split(',')]
+        except ValueError:
+            return
+        with self._lock:
+            self._remaining = [a - u for a, u in zip(allowed, used)]
+            self.headroom = min(self._remaining)
+            self._check_headroom()
+
+    def _check_headroom(self):
+        """Block new requests until the window resets if a quota is nearly used up (lock held)"""
+        # Strava's windows reset on wall-clock boundaries: every quarter hour and at midnight UTC
+        now = time.time()
+        for remaining, (_, window) in zip(self._remaining, self.limits):
+            if remaining <= self.min_headroom:
+                reset = (now // window + 1) * window
+                if self._blocked_until is None or reset > self._blocked_until:
+                    self._blocked_until = reset
+                    print(f"Rate limit nearly reached, pausing requests for {reset - now:.0f}s")
+
+    def acquire(self):
+        """Block until a request can be made without exceeding any limit"""
+        while True:
+            with self._lock:
+                wait = self._try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def _try_acquire(self):
+        """Record a call if one is allowed now, otherwise return the seconds to wait (lock held)"""
+        if self._blocked_until is not None:
+            wait = self._blocked_until - time.time()
+            if wait > 0:
+                return wait
+            # The window has reset; calls made before it no longer count against the quota,
+            # so pace locally from an empty window until the next response reports usage
+            self._blocked_until = None
+            self._remaining = self.headroom = None
+            self._calls.clear()
+
+        now = time.monotonic()
+        longest_window = max(window for _, window in self.limits)
+        while self._calls and now - self._calls[0] >= longest_window:
+            self._calls.popleft()
+
+        # Server-reported quota left: count this call against it
+        if self.headroom is not None:
+            self._remaining = [r - 1 for r in self._remaining]
+            self.headroom -= 1
+            self._calls.append(now)
+            self._check_headroom()
+            return 0
+
+        wait = 0
+        for max_requests, window in self.limits:
+            recent = [t for t in self._calls if now - t < window]
+            if len(recent) >= max_requests:
+                wait = max(wait, window - (now - recent[-max_requests]))
+
+        if wait <= 0:
+            self._calls.append(now)
+        return wait
+
 
 class StravaAnalyzer:
-    def __init__(self, access_token=None):
+    BACKOFF_BASE = 1.0
+    BACKOFF_CAP = 60.0
+    MAX_RETRIES = 5
+
+    def __init__(self, access_token=None, cache_dir='.strava_cache', max_workers=8):
         """
         Initialize Strava analyzer
         
         Args:
             access_token: Your Strava access token. If None, uses STRAVA_ACCESS_TOKEN env var
+            cache_dir: Directory where detailed activity JSON is cached between runs
+            max_workers: Concurrent detail requests; also the size of the connection pool
         """
-        self.access_token = access_token or os.getenv('STRAVA_ACCESS_TOKEN')
         self.activities_df = None
+        # Start time of the oldest activity whose details failed with a transient error
+        # (429, 5xx, network) in the last load_activities() call; save_to_csv() keeps
+        # the sync cursor before it. Permanent failures (e.g. 404) do not hold it back
+        self.oldest_failed_start = None
+        self._transient_failures = set()
+        self.cache_dir = Path(cache_dir)
+        self.max_workers = max_workers
+
+        # One pooled session so every API call reuses the same TCP/TLS connections.
+        # The pool holds exactly one connection per worker thread, so no extra
+        # handshakes are made for connections that would be discarded after use.
+        self.session = requests.Session()
+        # Sets the session's Authorization header once for every request
+        self.access_token = access_token or os.getenv('STRAVA_ACCESS_TOKEN')
+        # Transient server errors and dropped connections are retried inside urllib3;
+        # 429s are left to _request_with_retry, which also tracks the rate-limit headers
+        retries = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=['GET'],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retries)
+        self.session.mount('https://', adapter)
+        self.rate_limiter = RateLimiter()
+
+    @property
+    def access_token(self):
+        return self._access_token
+
+    @access_token.setter
+    def access_token(self, token):
+        """Keep the session's Authorization header in sync when the token is replaced"""
+        self._access_token = token
+        if token:
+            self.session.headers['Authorization'] = f'Bearer {token}'
+        else:
+            self.session.headers.pop('Authorization', None)
+
+    def close(self):
+        """Close the underlying HTTP session"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
         
     def test_connection(self):
         """Test if we can connect to Strava API"""
         if not self.access_token:
             return False, "No access token provided. Run strava_token_helper.py first."
-            
-        headers = {'Authorization': f'Bearer {self.access_token}'}
+
         url = "https://www.strava.com/api/v3/athlete"
         
         try:
-            response = requests.get(url, headers=headers)
+            response = self._request_with_retry(url)
             if response.status_code == 200:
-                athlete_data = response.json()
+                athlete_data = _json_loads(response.content)
                 name = f"{athlete_data.get('firstname', '')} {athlete_data.get('lastname', '')}"
                 return True, f"Connected as {name}"
             else:
@@ -34,35 +274,81 @@ class StravaAnalyzer:
         except Exception as e:
             return False, f"Connection failed: {e}"
     
-    def load_activities(self, pages=3, detailed=True, delay=0.2):
-        """Load Strava activities, optionally fetching detailed info for each"""
-        connected, message = self.test_connection()
-        if not connected:
-            print(f"Failure: {message}")
+    def load_activities(self, pages=3, detailed=True, delay=None, sync_dir=None):
+        """Load Strava activities, optionally fetching detailed info for each
+
+        Page and detail requests are issued concurrently by up to self.max_workers
+        threads sharing the pooled session; the rate limiter keeps them within quota.
+        If sync_dir holds a previous save_to_csv() export, only activities newer
+        than that export are fetched and merged into it. delay is accepted for
+        backward compatibility and ignored, since the rate limiter does the pacing.
+        """
+        # No separate /athlete round-trip here: an invalid token surfaces on the first page.
+        # test_connection() remains available as an explicit diagnostic.
+        if not self.access_token:
+            print("Failure: No access token provided. Run strava_token_helper.py first.")
             return None
-        
-        print(f"Success: {message}")
+
         print("Loading Strava activities...")
+        if pages < 1:
+            print("No activities loaded.")
+            return None
+
+        after, previous_df, per_page = None, None, 30
+        if sync_dir is not None:
+            after, previous_df = self._load_last_sync(sync_dir)
+            if after is not None:
+                per_page = 200  # Strava's maximum page size
+                print(f"Fetching activities since {datetime.fromtimestamp(after)}")
+
+        fetch_page = partial(self._get_activities_page, per_page=per_page, after=after)
+        self.oldest_failed_start = None
+        self._transient_failures = set()
+
+        # Sized for the most pages we can fetch; results are written by position
+        all_activities = [None] * (pages * per_page)
+        count = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Page 1 alone tells us whether more pages exist; the rest are requested concurrently
+            first_page = fetch_page(1)
+            if first_page is None:
+                print("Failure: Could not load activities from Strava.")
+                return None
+            page_results = [first_page]
+            if first_page and len(first_page) == per_page and pages > 1:
+                page_results.extend(executor.map(fetch_page, range(2, pages + 1)))
 
-        all_activities = []
-        for page in range(1, pages + 1):
-            print(f"Fetching page {page}...", end=" ")
-            activities = self._get_activities_page(page)
-            if activities:
-                print(f"found {len(activities)} items")
-                if detailed:
-                    for activity in activities:
-                        details = self._get_activity_details(activity["id"])
-                        if details:
-                            all_activities.append(details)
-                        time.sleep(delay)  # avoid hitting rate limits
+            for page, activities in enumerate(page_results, start=1):
+                print(f"Fetching page {page}...", end=" ")
+                if activities:
+                    print(f"found {len(activities)} items")
+                    if detailed:
+                        results = executor.map(self._get_activity_record, [a["id"] for a in activities])
+                        for i, (record, summary) in enumerate(zip(results, activities), start=count):
+                            all_activities[i] = record
+                            if record is None and summary["id"] in self._transient_failures:
+                                self._note_failed(summary)
+                    else:
+                        all_activities[count:count + len(activities)] = map(self._extract_record, activities)
+                    count += len(activities)
+                    if len(activities) < per_page:
+                        break
                 else:
-                    all_activities.extend(activities)
-            else:
-                print("No more activities or error occurred.")
-                break
+                    print("No more activities or error occurred.")
+                    break
 
+        # Drop unused slots and activities whose details could not be fetched
+        all_activities = [a for a in all_activities[:count] if a]
         self.activities_df = self._activities_to_dataframe(all_activities)
+        if previous_df is not None:
+            print(f"Merging {len(self.activities_df)} new activities into {len(previous_df)} saved ones")
+            if not self.activities_df.empty:
+                merged = pd.concat([previous_df, self.activities_df], ignore_index=True)
+                merged = merged.drop_duplicates('id', keep='last').reset_index(drop=True)
+            else:
+                merged = previous_df
+            # The saved file and concat both widen dtypes (int64, float64, object), so reapply them
+            self.activities_df = self._apply_dtypes(merged)
         
         if not self.activities_df.empty:
             print(f"Successfully loaded {len(self.activities_df)} activities!")
@@ -71,15 +357,64 @@ class StravaAnalyzer:
             print("No activities loaded.")
             return None
 
-    def _get_activities_page(self, page=1, per_page=30):
-        """Fetch one page of summary activities"""
-        headers = {'Authorization': f'Bearer {self.access_token}'}
+    def _note_failed(self, summary):
+        """Remember the start time of an activity whose details may load on a later sync"""
+        start = pd.to_datetime(summary.get('start_date'), errors='coerce', utc=True)
+        if pd.isna(start):
+            return
+        if self.oldest_failed_start is None or start < self.oldest_failed_start:
+            self.oldest_failed_start = start
+
+    def _load_last_sync(self, sync_dir):
+        """Read the last sync marker and its CSV, returning (after_timestamp, DataFrame)"""
+        sync_path = os.path.join(sync_dir, LAST_SYNC_FILE)
+        if not os.path.exists(sync_path):
+            return None, None
+        try:
+            with open(sync_path) as f:
+                last_sync = json.load(f)
+            path = last_sync['path']
+            previous_df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring last sync state: {e}")
+            return None, None
+
+        previous_df['start_date'] = pd.to_datetime(previous_df['start_date'], errors='coerce', utc=True, format='ISO8601')
+        return int(last_sync['last_start_date']), previous_df
+
+    def _request_with_retry(self, url, params=None, stream=False):
+        """GET a Strava endpoint, backing off and retrying when rate limited (HTTP 429)"""
+        delay = self.BACKOFF_BASE
+        for attempt in range(self.MAX_RETRIES + 1):
+            self.rate_limiter.acquire()
+            response = self.session.get(url, params=params, stream=stream)
+            self.rate_limiter.update(response.headers)
+            if response.status_code != 429 or attempt == self.MAX_RETRIES:
+                return response
+            response.close()  # release the connection before waiting
+
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = float(retry_after)
+            else:
+                # Decorrelated jitter: spread retries out instead of retrying in lockstep
+                delay = min(self.BACKOFF_CAP, random.uniform(self.BACKOFF_BASE, delay * 3))
+            print(f"Rate limited, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def _get_activities_page(self, page=1, per_page=30, after=None):
+        """Fetch one page of summary activities, optionally only those started after an epoch timestamp"""
         url = "https://www.strava.com/api/v3/athlete/activities"
         params = {'per_page': per_page, 'page': page}
+        if after is not None:
+            params['after'] = after
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = self._request_with_retry(url, params=params)
             if response.status_code == 200:
-                return response.json()
+                return _json_loads(response.content)
+            elif response.status_code == 401:
+                print("Error 401: Check if token is valid")
+                return None
             else:
                 print(f"Error {response.status_code}")
                 return None
@@ -88,90 +423,136 @@ class StravaAnalyzer:
             return None
 
     def _get_activity_details(self, activity_id):
-        """Fetch full detail for a single activity"""
-        headers = {'Authorization': f'Bearer {self.access_token}'}
+        """Fetch full detail for a single activity, using the on-disk cache when available"""
+        cache_path = self.cache_dir / f"{activity_id}.json"
+        try:
+            return _json_loads(cache_path.read_bytes())
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            # Unreadable or corrupt entry: drop it and fetch the activity again
+            print(f"Discarding cached {activity_id}: {e}")
+            cache_path.unlink(missing_ok=True)
+
         url = f"https://www.strava.com/api/v3/activities/{activity_id}"
         try:
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"Error fetching {activity_id}: {response.status_code}")
-                return None
+            # Stream so the decoded body is read once and the same bytes are cached and parsed
+            with self._request_with_retry(url, stream=True) as response:
+                if response.status_code == 200:
+                    body = response.raw.read(decode_content=True)
+                    # Parse before caching so a truncated or non-JSON body is never stored
+                    details = _json_loads(body)
+                    # Write via a temp file so an interrupted run never leaves a truncated entry
+                    self.cache_dir.mkdir(parents=True, exist_ok=True)
+                    tmp_path = cache_path.with_suffix('.tmp')
+                    tmp_path.write_bytes(body)
+                    tmp_path.replace(cache_path)
+                    return details
+                else:
+                    print(f"Error fetching {activity_id}: {response.status_code}")
+                    # Rate limiting and server errors may clear up; other 4xx will not
+                    if response.status_code == 429 or response.status_code >= 500:
+                        self._transient_failures.add(activity_id)
+                    return None
         except Exception as e:
             print(f"Failed fetching {activity_id}: {e}")
+            self._transient_failures.add(activity_id)
             return None
 
-    def _activities_to_dataframe(self, activities):
-        """Convert JSON activities to DataFrame with enhanced data"""
-        if not activities:
+    def _get_activity_record(self, activity_id):
+        """Fetch one activity's details and reduce them to a flat record"""
+        details = self._get_activity_details(activity_id)
+        return self._extract_record(details) if details else None
+
+    @staticmethod
+    def _extract_record(activity):
+        """Keep only the fields we use from an activity payload so the raw JSON can be freed"""
+        record = {f: activity[f] for f in ACTIVITY_FIELDS if f in activity}
+        if 'segment_efforts' in activity:
+            segment_efforts = activity['segment_efforts']
+            record['segment_efforts_count'] = len(segment_efforts) if isinstance(segment_efforts, list) else 0
+        return record
+
+    def _activities_to_dataframe(self, records):
+        """Convert extracted activity records (see _extract_record) to DataFrame with enhanced data"""
+        records = list(records)
+        if not records:
             return pd.DataFrame()
 
-        df = pd.json_normalize(activities)
-        df['start_date'] = pd.to_datetime(df['start_date'], errors='coerce')
+        fields = [f for f in ACTIVITY_FIELDS if any(f in r for r in records)]
+        segment_efforts_count = None
+        if any('segment_efforts_count' in r for r in records):
+            segment_efforts_count = np.fromiter(
+                (r.get('segment_efforts_count', 0) for r in records),
+                dtype=np.int32, count=len(records),
+            )
+
+        # Build the frame column by column (no per-row dict -> DataFrame transpose);
+        # numeric fields become float64 arrays with NaN for missing values
+        n = len(records)
+        columns = {}
+        for f in fields:
+            if f in NUMERIC_FIELDS:
+                columns[f] = np.fromiter(
+                    (np.nan if r.get(f) is None else r[f] for r in records),
+                    dtype=np.float64, count=n,
+                )
+            else:
+                columns[f] = [r.get(f) for r in records]
+
+        df = pd.DataFrame(columns)
+        # One vectorised ISO-8601 parse for the whole column
+        df['start_date'] = pd.to_datetime(df['start_date'], errors='coerce', utc=True, format='ISO8601')
+
+        # Derived metrics are collected here and added in a single concat at the end
+        derived = {}
 
         # Add derived metrics
-        if 'distance' in df.columns:
-            df['distance_km'] = df['distance'] / 1000
+        if 'distance' in columns:
+            derived['distance_km'] = columns['distance'] / 1000
         
         # TIME METRICS - with elapsed time as priority
-        if 'elapsed_time' in df.columns:
-            df['elapsed_time_min'] = df['elapsed_time'] / 60
-        if 'moving_time' in df.columns:
-            df['moving_time_min'] = df['moving_time'] / 60
+        if 'elapsed_time' in columns:
+            derived['elapsed_time_min'] = columns['elapsed_time'] / 60
+        if 'moving_time' in columns:
+            derived['moving_time_min'] = columns['moving_time'] / 60
         
         # Calculate efficiency ratio (moving time vs elapsed time)
-        if 'elapsed_time' in df.columns and 'moving_time' in df.columns:
-            df['efficiency_ratio'] = df['moving_time'] / df['elapsed_time']
+        if 'elapsed_time' in columns and 'moving_time' in columns:
+            derived['efficiency_ratio'] = _safe_divide(columns['moving_time'], columns['elapsed_time'])
         
-        if 'average_speed' in df.columns:
-            df['average_speed_kmh'] = df['average_speed'] * 3.6
-        if 'max_speed' in df.columns:
-            df['max_speed_kmh'] = df['max_speed'] * 3.6
+        if 'average_speed' in columns:
+            derived['average_speed_kmh'] = columns['average_speed'] * 3.6
+        if 'max_speed' in columns:
+            derived['max_speed_kmh'] = columns['max_speed'] * 3.6
         
         # Pace based on elapsed time (more realistic for total activity time)
-        if 'distance' in df.columns and 'elapsed_time' in df.columns:
-            df['pace_min_per_km_elapsed'] = (df['elapsed_time'] / 60) / (df['distance'] / 1000)
+        if 'distance' in columns and 'elapsed_time' in columns:
+            derived['pace_min_per_km_elapsed'] = _safe_divide(derived['elapsed_time_min'], derived['distance_km'])
         
         # Also keep moving pace for comparison
-        if 'distance' in df.columns and 'moving_time' in df.columns:
-            df['pace_min_per_km_moving'] = (df['moving_time'] / 60) / (df['distance'] / 1000)
+        if 'distance' in columns and 'moving_time' in columns:
+            derived['pace_min_per_km_moving'] = _safe_divide(derived['moving_time_min'], derived['distance_km'])
         
         # Add date/time breakdown
-        df['year'] = df['start_date'].dt.year
-        df['month'] = df['start_date'].dt.month
-        df['day_of_week'] = df['start_date'].dt.day_name()
-        df['hour'] = df['start_date'].dt.hour
+        start = df['start_date'].dt
+        derived['year'] = start.year
+        derived['month'] = start.month
+        # Monday=0 ... Sunday=6; map through DAY_NAMES when displaying
+        derived['day_of_week'] = start.dayofweek
+        derived['hour'] = start.hour
 
         #  Heart rate metrics
         if 'average_heartrate' in df.columns:
-            df['has_hr_data'] = df['average_heartrate'].notna()
+            derived['has_hr_data'] = df['average_heartrate'].notna()
         
         #  Elevation data
-        if 'total_elevation_gain' in df.columns:
-            df['elevation_gain_km'] = df['total_elevation_gain'] / 1000
+        if 'total_elevation_gain' in columns:
+            derived['elevation_gain_km'] = columns['total_elevation_gain'] / 1000
         
         #  Segment efforts count
-        if 'segment_efforts' in df.columns:
-            df['segment_efforts_count'] = df['segment_efforts'].apply(
-                lambda x: len(x) if isinstance(x, list) else 0
-            )
-        
-        #  Social engagement metrics
-        engagement_columns = ['kudos_count', 'comment_count', 'athlete_count', 'photo_count']
-        for col in engagement_columns:
-            if col in df.columns:
-                df[col] = df[col].fillna(0).astype(int)
-        
-        #  Achievement metrics
-        achievement_columns = ['achievement_count', 'pr_count']
-        for col in achievement_columns:
-            if col in df.columns:
-                df[col] = df[col].fillna(0).astype(int)
-        
-        #  Training metrics
-        if 'suffer_score' in df.columns:
-            df['suffer_score'] = df['suffer_score'].fillna(0).astype(int)
+        if segment_efforts_count is not None:
+            derived['segment_efforts_count'] = segment_efforts_count
         
         #  Workout type classification
         if 'workout_type' in df.columns:
@@ -182,23 +563,23 @@ class StravaAnalyzer:
                 2: 'Long Run',
                 3: 'Workout'
             }
-            df['workout_type_name'] = df['workout_type'].map(workout_type_map).fillna('Default')
+            derived['workout_type_name'] = df['workout_type'].map(workout_type_map).fillna('Default')
         
         #  Manual activity flag
         if 'manual' in df.columns:
-            df['is_manual'] = df['manual'].fillna(False)
+            derived['is_manual'] = df['manual'].fillna(False)
         
         #  Device info (simplified)
         if 'device_name' in df.columns:
             df['device_name'] = df['device_name'].fillna('Unknown')
         
         #  Temperature data
-        if 'average_temp' in df.columns:
-            df['temperature_c'] = df['average_temp']
+        if 'average_temp' in columns:
+            derived['temperature_c'] = columns['average_temp']
         
         #  Running cadence (if available)
-        if 'average_cadence' in df.columns:
-            df['cadence_rpm'] = df['average_cadence']
+        if 'average_cadence' in columns:
+            derived['cadence_rpm'] = columns['average_cadence']
         
         #  Location data (city level only)
         location_columns = ['location_city', 'location_state', 'location_country']
@@ -206,6 +587,30 @@ class StravaAnalyzer:
             if col in df.columns:
                 df[col] = df[col].fillna('Unknown')
 
+        df = pd.concat([df, pd.DataFrame(derived, index=df.index)], axis=1)
+        return self._apply_dtypes(df)
+
+    @staticmethod
+    def _apply_dtypes(df):
+        """Store columns in compact dtypes: float32, narrow integers and categoricals"""
+        #  Columns aggregated by the analysis only need single precision
+        for col in FLOAT32_FIELDS:
+            if col in df.columns:
+                df[col] = df[col].astype(np.float32)
+
+        #  Social engagement, achievement and training counts in the narrowest integer type that fits
+        for col, dtype in INT_DOWNCAST.items():
+            if col in df.columns:
+                df[col] = df[col].fillna(0).astype(dtype)
+
+        for col, dtype in DATE_PART_DTYPES.items():
+            if col in df.columns:
+                df[col] = df[col].astype(dtype)
+
+        #  Low-cardinality text columns as categoricals
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
         return df
 
     def get_activity_statistics(self):
@@ -214,33 +619,79 @@ class StravaAnalyzer:
             print("No activities loaded. Run load_activities() first.")
             return {}
         
+        df = self.activities_df
+        agg_spec = {
+            'distance_km': 'sum',
+            'elapsed_time_min': 'sum',
+            'moving_time_min': 'sum',
+            'efficiency_ratio': 'mean',
+            'kudos_count': 'sum',
+            'has_hr_data': 'sum',
+            'elevation_gain_km': 'sum',
+            'segment_efforts_count': 'sum',
+        }
+        # Aggregate every available column in a single pass; missing ones report 0.
+        # The result is one float Series, so counts are converted back to int below
+        spec = {col: func for col, func in agg_spec.items() if col in df.columns}
+        results = df.agg(spec) if spec else pd.Series(dtype=float)
+        totals = {col: results.get(col, 0) for col in agg_spec}
+
         stats = {
-            'total_activities': len(self.activities_df),
-            'total_distance_km': self.activities_df['distance_km'].sum() if 'distance_km' in self.activities_df else 0,
-            'total_elapsed_time_hrs': self.activities_df['elapsed_time_min'].sum() / 60 if 'elapsed_time_min' in self.activities_df else 0,
-            'total_moving_time_hrs': self.activities_df['moving_time_min'].sum() / 60 if 'moving_time_min' in self.activities_df else 0,
-            'avg_efficiency_ratio': self.activities_df['efficiency_ratio'].mean() if 'efficiency_ratio' in self.activities_df else 0,
-            'activity_types': self.activities_df['type'].value_counts().to_dict(),
-            'total_kudos': self.activities_df['kudos_count'].sum() if 'kudos_count' in self.activities_df else 0,
-            'activities_with_hr': self.activities_df['has_hr_data'].sum() if 'has_hr_data' in self.activities_df else 0,
-            'total_elevation_gain_km': self.activities_df['elevation_gain_km'].sum() if 'elevation_gain_km' in self.activities_df else 0,
-            'total_segment_efforts': self.activities_df['segment_efforts_count'].sum() if 'segment_efforts_count' in self.activities_df else 0,
+            'total_activities': len(df),
+            'total_distance_km': totals['distance_km'],
+            'total_elapsed_time_hrs': totals['elapsed_time_min'] / 60,
+            'total_moving_time_hrs': totals['moving_time_min'] / 60,
+            'avg_efficiency_ratio': totals['efficiency_ratio'],
+            'activity_types': df['type'].value_counts().to_dict(),
+            'total_kudos': int(totals['kudos_count']),
+            'activities_with_hr': int(totals['has_hr_data']),
+            'total_elevation_gain_km': totals['elevation_gain_km'],
+            'total_segment_efforts': int(totals['segment_efforts_count']),
         }
         
         return stats
 
-    def save_to_csv(self, output_dir="."):
-        """Save the DataFrame to a dated CSV file"""
+    def save_to_csv(self, output_dir=".", file_format="csv.gz"):
+        """Save the DataFrame to a dated file and record the sync point next to it
+
+        Args:
+            output_dir: Directory to write into
+            file_format: 'csv.gz' (default), 'csv' or 'parquet' (requires pyarrow)
+        """
         if self.activities_df is None or self.activities_df.empty:
             print("No data to save.")
             return None
+        if file_format not in ('csv.gz', 'csv', 'parquet'):
+            print(f"Unsupported file format: {file_format}")
+            return None
 
         os.makedirs(output_dir, exist_ok=True)
         current_date = datetime.now().strftime("%Y-%m-%d")
-        filename = os.path.join(output_dir, f"Strava_Activities_{current_date}.csv")
-        self.activities_df.to_csv(filename, index=False)
-        print(f" Saved {len(self.activities_df)} activities to {filename}")
-        print(f"Columns: {len(self.activities_df.columns)} total")
+        filename = os.path.join(output_dir, f"Strava_Activities_{current_date}.{file_format}")
+
+        # Only write known columns; anything else is leftover payload
+        keep = [c for c in ACTIVITY_FIELDS + DERIVED_FIELDS if c in self.activities_df.columns]
+        export_df = self.activities_df[keep]
+        if file_format == 'parquet':
+            export_df.to_parquet(filename, index=False)
+        else:
+            compression = 'gzip' if file_format == 'csv.gz' else None
+            export_df.to_csv(filename, index=False, compression=compression, chunksize=10_000)
+
+        # Strava's `after` is exclusive, so stop one second before the oldest failed
+        # activity; the next sync re-fetches it (already-saved ones merge by id)
+        last_start = self.activities_df['start_date'].max()
+        if self.oldest_failed_start is not None:
+            last_start = min(last_start, self.oldest_failed_start - pd.Timedelta(seconds=1))
+        last_sync = {
+            'last_start_date': int(last_start.timestamp()),
+            'path': os.path.abspath(filename),
+        }
+        with open(os.path.join(output_dir, LAST_SYNC_FILE), 'w') as f:
+            json.dump(last_sync, f)
+
+        print(f" Saved {len(export_df)} activities to {filename}")
+        print(f"Columns: {len(export_df.columns)} total")
         return filename
 
 
@@ -252,9 +703,8 @@ def main():
         print("No access token found. Please run strava_token_helper.py first.")
         return
 
-    analyzer = StravaAnalyzer()
-
-    df = analyzer.load_activities(pages=3, detailed=True)
+    with StravaAnalyzer() as analyzer:
+        df = analyzer.load_activities(pages=3, detailed=True, sync_dir=".")
     if df is not None:
         analyzer.save_to_csv()
         
@@ -2,19 +2,76 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
+import warnings
 from datetime import datetime, timedelta
 
-def format_pace_min_sec(pace_decimal):
+# Columns the recent-run analysis, plots and run details read
+ANALYSIS_COLS = [
+    'start_date', 'sport_type', 'distance_km', 'pace_min_per_km_moving',
+    'elevation_gain_km', 'moving_time_min',
+]
+
+# Hot numeric columns, analysed in float32 to halve the bytes each reduction reads
+FLOAT32_COLS = ['distance_km', 'pace_min_per_km_moving', 'elevation_gain_km', 'moving_time_min']
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the NumPy version of _pace_split is used instead
+    njit = None
+
+def _format_pace_fast(pace_decimal):
     """
-    Convert pace from decimal minutes to minutes:seconds format
+    format_pace_min_sec without the missing-value check, for callers that know the pace is a number
     """
-    if pd.isna(pace_decimal):
-        return "N/A"
-    
     minutes = int(pace_decimal)
     seconds = int((pace_decimal - minutes) * 60)
     return f"{minutes}:{seconds:02d}"
 
+def format_pace_min_sec(pace_decimal):
+    """
+    Convert pace from decimal minutes to minutes:seconds format
+    """
+    # NaN (and NaT) are the only values not equal to themselves; cheaper than pd.isna on a scalar.
+    # pd.NA has no truth value, so it is caught by identity first
+    if pace_decimal is None or pace_decimal is pd.NA or pace_decimal != pace_decimal:
+        return "N/A"
+    return _format_pace_fast(pace_decimal)
+
+def _pace_split_numpy(paces):
+    """
+    Split decimal-minute paces into whole minutes and seconds arrays
+    """
+    minutes = paces.astype(np.int32)
+    seconds = ((paces - minutes) * 60).astype(np.int32)
+    return minutes, seconds
+
+if njit is not None:
+    @njit(cache=True)
+    def _pace_split(paces):
+        """
+        Compiled equivalent of _pace_split_numpy
+        """
+        n = paces.shape[0]
+        minutes = np.empty(n, np.int32)
+        seconds = np.empty(n, np.int32)
+        for i in range(n):
+            m = int(paces[i])
+            minutes[i] = m
+            seconds[i] = int((paces[i] - m) * 60.0)
+        return minutes, seconds
+else:
+    _pace_split = _pace_split_numpy
+
+def format_paces_min_sec(paces):
+    """
+    Vectorised format_pace_min_sec: convert an array of decimal-minute paces to min:sec strings
+    """
+    paces = np.asarray(paces, dtype=np.float64)
+    valid = np.isfinite(paces)
+    minutes, seconds = _pace_split(np.where(valid, paces, 0.0))
+    return [f"{m}:{s:02d}" if ok else "N/A"
+            for m, s, ok in zip(minutes.tolist(), seconds.tolist(), valid.tolist())]
+
 def convert_elevation_km_to_m(elevation_km):
     """
     Convert elevation from kilometers to meters
@@ -23,22 +80,62 @@ def convert_elevation_km_to_m(elevation_km):
         return 0
     return elevation_km * 1000
 
+def group_by_week(runs):
+    """
+    Group runs into Monday-Sunday weeks; keys are the week-ending Sundays (use .isocalendar().week for the ISO week)
+    """
+    return runs.groupby(pd.Grouper(key='start_date', freq='W-SUN'))
+
+def _recent_run_positions(df, sport_type_filter, cutoff_date):
+    """
+    Row positions of sport_type_filter activities on or after cutoff_date, in date order
+    """
+    # eval() lets numexpr (when installed) evaluate both comparisons in one fused pass
+    mask = df.eval("sport_type == @sport_type_filter and start_date >= @cutoff_date")
+    positions = np.flatnonzero(mask.to_numpy(dtype=bool))
+    dates = df['start_date'].to_numpy(dtype='datetime64[ns]')[positions]
+    return positions[np.argsort(dates, kind='mergesort')]
+
 def analyze_recent_running_insights(df, sport_type_filter='Run', weeks=3):
     """
     Analyze running data from the last 3 weeks only with pace in min:sec format
     Also corrected elevation (km to m)
     """
     
-    df['start_date'] = pd.to_datetime(df['start_date'])
+    # Only parse when needed (e.g. a frame read back from CSV); repeated calls reuse the parsed column
+    if not pd.api.types.is_datetime64_any_dtype(df['start_date']):
+        df['start_date'] = pd.to_datetime(df['start_date'])
     cutoff_date = df['start_date'].max() - timedelta(weeks=weeks)
-    recent_runs = df[(df['sport_type'] == sport_type_filter) & 
-                     (df['start_date'] >= cutoff_date)].copy()
+    # Positions come back in date order; the trend halves, plots and run details all rely on it.
+    # Taking the window's rows first keeps the copy to those rows; selecting only
+    # ANALYSIS_COLS then yields a new, narrow frame, so no .copy() is needed
+    positions = _recent_run_positions(df, sport_type_filter, cutoff_date)
+    recent_runs = (df.iloc[positions][ANALYSIS_COLS]
+                   .astype({col: np.float32 for col in FLOAT32_COLS})
+                   .reset_index(drop=True))
     
     if recent_runs.empty:
         print(f"No {sport_type_filter} activities found in the last {weeks} weeks!")
         return
     
-    recent_runs['elevation_gain_m'] = recent_runs['elevation_gain_km'].apply(convert_elevation_km_to_m)
+    # Vectorised km -> m conversion; convert_elevation_km_to_m is kept for scalar callers
+    recent_runs['elevation_gain_m'] = recent_runs['elevation_gain_km'].fillna(0).to_numpy() * np.float32(1000)
+    
+    # Pull the hot columns out once and compute every summary scalar from the arrays
+    pace = recent_runs['pace_min_per_km_moving'].to_numpy()
+    dist = recent_runs['distance_km'].to_numpy()
+    elev = recent_runs['elevation_gain_m'].to_numpy()
+    n_runs = len(recent_runs)
+    
+    # All-NaN (or single-value, for the std) inputs give NaN like the pandas reductions did;
+    # NumPy's RuntimeWarnings about them are not meant for users
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        pace_mean, pace_min, pace_max = np.nanmean(pace), np.nanmin(pace), np.nanmax(pace)
+        pace_median = np.nanmedian(pace)
+        pace_std = np.nanstd(pace, ddof=1)
+        dist_sum, dist_max = np.nansum(dist), np.nanmax(dist)
+        elev_sum, elev_mean, elev_max = np.nansum(elev), np.nanmean(elev), np.nanmax(elev)
     
     print("=" * 60)
     print(f"LAST {weeks} WEEKS RUNNING ANALYSIS")
@@ -46,29 +143,33 @@ def analyze_recent_running_insights(df, sport_type_filter='Run', weeks=3):
     print(f"Date Range: {recent_runs['start_date'].min().strftime('%Y-%m-%d')} to {recent_runs['start_date'].max().strftime('%Y-%m-%d')}")
     print("=" * 60)
     
-    recent_runs['week_number'] = recent_runs['start_date'].dt.isocalendar().week
-    recent_runs['week_label'] = 'Week ' + recent_runs['week_number'].astype(str)
-    
     print("\nWEEKLY summary stats:")
-    for week_num, week_data in recent_runs.groupby('week_number'):
-        week_runs = week_data
-        avg_pace = week_runs['pace_min_per_km_moving'].mean()
-        total_elevation_m = week_runs['elevation_gain_m'].sum()
-        
-        print(f"Week {week_num} ({week_runs['start_date'].min().strftime('%m/%d')} - {week_runs['start_date'].max().strftime('%m/%d')}):")
-        print(f"  Runs: {len(week_runs)}")
-        print(f"  Total distance: {week_runs['distance_km'].sum():.1f} km")
-        print(f"  Average pace: {format_pace_min_sec(avg_pace)} min/km")
-        print(f"  Elevation gain: {total_elevation_m:.0f} m")
+    weekly = group_by_week(recent_runs).agg(
+        runs=('distance_km', 'size'),
+        total_km=('distance_km', 'sum'),
+        avg_pace=('pace_min_per_km_moving', 'mean'),
+        elevation_m=('elevation_gain_m', 'sum'),
+        start=('start_date', 'min'),
+        end=('start_date', 'max'),
+    )
+    weekly = weekly[weekly['runs'] > 0]
+    # Check the weekly means for NaN once instead of on every row
+    format_pace = format_pace_min_sec if weekly['avg_pace'].isna().any() else _format_pace_fast
+    for week_end, week in zip(weekly.index, weekly.itertuples(index=False)):
+        print(f"Week {week_end.isocalendar().week} ({week.start.strftime('%m/%d')} - {week.end.strftime('%m/%d')}):")
+        print(f"  Runs: {week.runs}")
+        print(f"  Total distance: {week.total_km:.1f} km")
+        print(f"  Average pace: {format_pace(week.avg_pace)} min/km")
+        print(f"  Elevation gain: {week.elevation_m:.0f} m")
     
     print("\nRECENT TRENDS:")
-    if len(recent_runs) >= 2:
-        first_half = recent_runs.iloc[:len(recent_runs)//2]
-        second_half = recent_runs.iloc[len(recent_runs)//2:]
-        
-        pace_trend = second_half['pace_min_per_km_moving'].mean() - first_half['pace_min_per_km_moving'].mean()
-        distance_trend = second_half['distance_km'].mean() - first_half['distance_km'].mean()
-        elevation_trend = second_half['elevation_gain_m'].mean() - first_half['elevation_gain_m'].mean()
+    if n_runs >= 2:
+        half = n_runs // 2
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            pace_trend = np.nanmean(pace[half:]) - np.nanmean(pace[:half])
+            distance_trend = np.nanmean(dist[half:]) - np.nanmean(dist[:half])
+            elevation_trend = np.nanmean(elev[half:]) - np.nanmean(elev[:half])
         
         trend_direction = "improving" if pace_trend < 0 else "slowing"
         print(f"Pace trend: {format_pace_min_sec(abs(pace_trend))} min/km ({trend_direction})")
@@ -76,44 +177,46 @@ def analyze_recent_running_insights(df, sport_type_filter='Run', weeks=3):
         print(f"Elevation trend: {elevation_trend:+.0f} m per run")
     
     print("\nCURRENT FITNESS SNAPSHOT:")
-    current_avg_pace = recent_runs['pace_min_per_km_moving'].mean()
-    total_elevation_m = recent_runs['elevation_gain_m'].sum()
-    
-    print(f"Average weekly distance: {recent_runs['distance_km'].sum() / weeks:.1f} km")
-    print(f"Average runs per week: {len(recent_runs) / weeks:.1f}")
-    print(f"Current average pace: {format_pace_min_sec(current_avg_pace)} min/km")
-    print(f"Longest recent run: {recent_runs['distance_km'].max():.1f} km")
-    print(f"Total elevation gain: {total_elevation_m:.0f} m")
-    print(f"Average elevation per run: {recent_runs['elevation_gain_m'].mean():.0f} m")
+    print(f"Average weekly distance: {dist_sum / weeks:.1f} km")
+    print(f"Average runs per week: {n_runs / weeks:.1f}")
+    print(f"Current average pace: {format_pace_min_sec(pace_mean)} min/km")
+    print(f"Longest recent run: {dist_max:.1f} km")
+    print(f"Total elevation gain: {elev_sum:.0f} m")
+    print(f"Average elevation per run: {elev_mean:.0f} m")
     
     print("\nBEST RECENT PERFORMANCES:")
-    if len(recent_runs) > 0:
-        best_pace_run = recent_runs.loc[recent_runs['pace_min_per_km_moving'].idxmin()]
-        longest_run = recent_runs.loc[recent_runs['distance_km'].idxmax()]
-        most_elevation_run = recent_runs.loc[recent_runs['elevation_gain_m'].idxmax()]
-        
-        print(f"Fastest run: {format_pace_min_sec(best_pace_run['pace_min_per_km_moving'])} min/km ({best_pace_run['distance_km']:.1f} km)")
-        print(f"Longest run: {longest_run['distance_km']:.1f} km on {longest_run['start_date'].strftime('%m/%d')}")
+    if n_runs > 0:
+        # Positions from the hoisted arrays; iloc avoids label lookups.
+        # nanargmin/nanargmax raise on all-NaN input, so those lines are skipped
+        if not np.isnan(pace).all():
+            best_pace_run = recent_runs.iloc[int(np.nanargmin(pace))]
+            print(f"Fastest run: {format_pace_min_sec(best_pace_run['pace_min_per_km_moving'])} min/km ({best_pace_run['distance_km']:.1f} km)")
+        if not np.isnan(dist).all():
+            longest_run = recent_runs.iloc[int(np.nanargmax(dist))]
+            print(f"Longest run: {longest_run['distance_km']:.1f} km on {longest_run['start_date'].strftime('%m/%d')}")
+        most_elevation_run = recent_runs.iloc[int(np.nanargmax(elev))]
         print(f"Most elevation: {most_elevation_run['elevation_gain_m']:.0f} m on {most_elevation_run['start_date'].strftime('%m/%d')} ({most_elevation_run['distance_km']:.1f} km)")
     
     print("\nPACE DISTRIBUTION:")
-    pace_stats = recent_runs['pace_min_per_km_moving'].describe()
-    print(f"Fastest: {format_pace_min_sec(pace_stats['min'])} min/km")
-    print(f"Slowest: {format_pace_min_sec(pace_stats['max'])} min/km")
-    print(f"Median: {format_pace_min_sec(pace_stats['50%'])} min/km")
+    print(f"Fastest: {format_pace_min_sec(pace_min)} min/km")
+    print(f"Slowest: {format_pace_min_sec(pace_max)} min/km")
+    print(f"Median: {format_pace_min_sec(pace_median)} min/km")
     
     print("\nELEVATION ANALYSIS:")
-    elevation_stats = recent_runs['elevation_gain_m'].describe()
-    print(f"Highest elevation run: {elevation_stats['max']:.0f} m")
-    print(f"Average elevation per run: {elevation_stats['mean']:.0f} m")
-    print(f"Total elevation: {recent_runs['elevation_gain_m'].sum():.0f} m")
+    print(f"Highest elevation run: {elev_max:.0f} m")
+    print(f"Average elevation per run: {elev_mean:.0f} m")
+    print(f"Total elevation: {elev_sum:.0f} m")
     
     print("\nRECENT CONSISTENCY:")
-    days_between_runs = recent_runs['start_date'].sort_values().diff().dt.days.dropna()
-    avg_days_between = days_between_runs.mean() if not days_between_runs.empty else 0
+    # Mean of consecutive gaps telescopes to (last - first) / (n - 1)
+    if n_runs > 1:
+        run_dates = recent_runs['start_date'].to_numpy(dtype='datetime64[ns]')
+        avg_days_between = (run_dates.max() - run_dates.min()) / np.timedelta64(1, 'D') / (n_runs - 1)
+    else:
+        avg_days_between = 0
     
     print(f"Average days between runs: {avg_days_between:.1f}")
-    print(f"Running frequency: {len(recent_runs) / (weeks * 7):.2f} runs per day")
+    print(f"Running frequency: {n_runs / (weeks * 7):.2f} runs per day")
     
     if avg_days_between <= 2:
         print("Excellent consistency!")
@@ -123,9 +226,9 @@ def analyze_recent_running_insights(df, sport_type_filter='Run', weeks=3):
         print("Consider running more frequently")
     
     print("\nRECOMMENDATIONS FOR NEXT WEEK:")
-    avg_weekly_distance = recent_runs['distance_km'].sum() / weeks
-    avg_runs_per_week = len(recent_runs) / weeks
-    avg_weekly_elevation = recent_runs['elevation_gain_m'].sum() / weeks
+    avg_weekly_distance = dist_sum / weeks
+    avg_runs_per_week = n_runs / weeks
+    avg_weekly_elevation = elev_sum / weeks
     
     if avg_weekly_distance < 20:
         print(f"Maintain or gradually increase to {avg_weekly_distance + 5:.0f} km/week")
@@ -146,7 +249,6 @@ def analyze_recent_running_insights(df, sport_type_filter='Run', weeks=3):
     elif avg_weekly_elevation > 1500:
         print(f"Good hill training! ({avg_weekly_elevation:.0f}m/week)")
     
-    pace_std = recent_runs['pace_min_per_km_moving'].std()
     if pace_std < 0.5:
         print("Add pace variety: try intervals or tempo runs")
     else:
@@ -164,8 +266,9 @@ def create_recent_running_visualizations(recent_runs, weeks=3):
     fig, axes = plt.subplots(2, 2, figsize=(15, 12))
     fig.suptitle(f'Running Analysis - Last {weeks} Weeks', fontsize=16, fontweight='bold')
     
-    weekly_totals = recent_runs.groupby('week_label')['distance_km'].sum()
-    axes[0,0].bar(weekly_totals.index, weekly_totals.values, color='skyblue', alpha=0.7)
+    weekly_totals = group_by_week(recent_runs)['distance_km'].sum()
+    week_labels = [f'Week {w}' for w in weekly_totals.index.isocalendar().week]
+    axes[0,0].bar(week_labels, weekly_totals.values, color='skyblue', alpha=0.7)
     axes[0,0].set_title('Weekly Distance')
     axes[0,0].set_ylabel('Distance (km)')
     axes[0,0].tick_params(axis='x', rotation=45)
@@ -187,8 +290,8 @@ def create_recent_running_visualizations(recent_runs, weeks=3):
     axes[0,1].yaxis.set_major_formatter(plt.FuncFormatter(pace_formatter))
     axes[0,1].invert_yaxis()
     
-    weekly_elevation = recent_runs.groupby('week_label')['elevation_gain_m'].sum()
-    axes[1,0].bar(weekly_elevation.index, weekly_elevation.values, color='orange', alpha=0.7)
+    weekly_elevation = group_by_week(recent_runs)['elevation_gain_m'].sum()
+    axes[1,0].bar(week_labels, weekly_elevation.values, color='orange', alpha=0.7)
     axes[1,0].set_title('Weekly Elevation Gain')
     axes[1,0].set_ylabel('Elevation (m)')
     axes[1,0].tick_params(axis='x', rotation=45)
@@ -213,14 +316,18 @@ def create_recent_running_visualizations(recent_runs, weeks=3):
     print(f"\nWEEKLY SUMMARY TABLE:")
     print(f"{'Week':<10} {'Runs':<6} {'Total km':<8} {'Avg km':<8} {'Avg Pace':<10} {'Elevation':<10}")
     print("-" * 60)
-    for week_label, week_data in recent_runs.groupby('week_label'):
-        runs_count = len(week_data)
-        total_km = week_data['distance_km'].sum()
-        avg_km = week_data['distance_km'].mean()
-        avg_pace = week_data['pace_min_per_km_moving'].mean()
-        elevation = week_data['elevation_gain_m'].sum()
-        
-        print(f"{week_label:<10} {runs_count:<6} {total_km:<8.1f} {avg_km:<8.1f} {format_pace_min_sec(avg_pace):<10} {elevation:<10.0f}")
+    weekly = group_by_week(recent_runs).agg(
+        runs=('distance_km', 'size'),
+        total_km=('distance_km', 'sum'),
+        avg_km=('distance_km', 'mean'),
+        avg_pace=('pace_min_per_km_moving', 'mean'),
+        elevation_m=('elevation_gain_m', 'sum'),
+    )
+    weekly = weekly[weekly['runs'] > 0]
+    format_pace = format_pace_min_sec if weekly['avg_pace'].isna().any() else _format_pace_fast
+    for week_end, week in zip(weekly.index, weekly.itertuples(index=False)):
+        week_label = f"Week {week_end.isocalendar().week}"
+        print(f"{week_label:<10} {week.runs:<6} {week.total_km:<8.1f} {week.avg_km:<8.1f} {format_pace(week.avg_pace):<10} {week.elevation_m:<10.0f}")
 
 def show_recent_run_details(recent_runs):
     """Show details of individual runs with formatted pace and corrected elevation"""
@@ -231,16 +338,18 @@ def show_recent_run_details(recent_runs):
     print(f"{'Date':<12} {'Distance':<10} {'Pace':<10} {'Elevation':<10} {'Time':<8}")
     print("-" * 60)
     
-    for _, run in recent_runs.sort_values('start_date').iterrows():
-        date_str = run['start_date'].strftime('%m/%d')
-        distance = run['distance_km']
-        pace = format_pace_min_sec(run['pace_min_per_km_moving'])
-        elevation = run['elevation_gain_m']
-        time_min = run['moving_time_min']
-        
-        hours = int(time_min // 60)
-        minutes = int(time_min % 60)
-        time_str = f"{hours}:{minutes:02d}" if hours > 0 else f"{minutes}min"
+    # Format every column up front, then print from plain lists.
+    # recent_runs is already in date order (see analyze_recent_running_insights)
+    dates = recent_runs['start_date'].dt.strftime('%m/%d').tolist()
+    distances = recent_runs['distance_km'].tolist()
+    paces = format_paces_min_sec(recent_runs['pace_min_per_km_moving'].to_numpy())
+    elevations = recent_runs['elevation_gain_m'].tolist()
+    time_min = recent_runs['moving_time_min'].to_numpy(dtype=np.float64)
+    hours = (time_min // 60).astype(np.int32).tolist()
+    minutes = (time_min % 60).astype(np.int32).tolist()
+    
+    for date_str, distance, pace, elevation, h, m in zip(dates, distances, paces, elevations, hours, minutes):
+        time_str = f"{h}:{m:02d}" if h > 0 else f"{m}min"
         
         print(f"{date_str:<12} {distance:<10.1f} {pace:<10} {elevation:<10.0f} {time_str:<8}")
 